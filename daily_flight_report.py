@@ -8,20 +8,41 @@ Flight Price Report
 Register free at: https://serpapi.com (100 searches/month, no credit card required)
 """
 
+import functools
+import hashlib
 import json
 import os
+import shelve
 import sys
 import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from email.message import EmailMessage
-from typing import Any, Dict, List, Optional
+from html import escape
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson   # optional: faster JSON parsing/serialisation
+except ImportError:
+    orjson = None
 
 # Load .env for local development
 load_dotenv()
 
+
+def _split_csv(value: str) -> List[str]:
+    """Split a comma-separated setting into stripped, non-empty items."""
+    return [item for item in map(str.strip, value.split(",")) if item]
+
+
 # ---------------------------------------------------------------------------
 # SMTP configuration – identical pattern to honda_passport
 # ---------------------------------------------------------------------------
@@ -33,7 +54,8 @@ SMTP_PASS = os.environ.get("SMTP_PASS", "").strip()
 
 EMAIL_FROM = os.environ.get("EMAIL_FROM", SMTP_USER)
 # Comma-separated list of recipients, e.g. "a@gmail.com,b@gmail.com"
-EMAIL_TO   = [e.strip() for e in os.environ.get("EMAIL_TO", SMTP_USER).split(",") if e.strip()]
+# Parsed once here; send_email() uses the list as-is.
+EMAIL_TO   = _split_csv(os.environ.get("EMAIL_TO", SMTP_USER))
 
 # ---------------------------------------------------------------------------
 # SerpApi configuration
@@ -48,6 +70,14 @@ _bool_env = lambda key: os.environ.get(key, "").strip().lower() in ("1", "true",
 SAVE_FIXTURES = _bool_env("SAVE_FIXTURES")
 MOCK_MODE     = _bool_env("MOCK_MODE")
 FIXTURES_DIR  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+if SAVE_FIXTURES:
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+
+# Live responses are cached on disk for CACHE_TTL_SECONDS (and never past local
+# midnight) so that re-running the report the same day doesn't spend API quota
+# again.  Set to 0 to disable.
+CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", str(6 * 3600)))
+_CACHE_PATH       = os.path.join(FIXTURES_DIR, "_cache.db")
 
 # ---------------------------------------------------------------------------
 # Search configuration
@@ -78,6 +108,7 @@ TRIP_TYPES_ENV = os.environ.get("TRIP_TYPES", "outbound,return,roundtrip").strip
 ADULTS      = int(os.environ.get("ADULTS", "1"))
 MAX_RESULTS = int(os.environ.get("MAX_RESULTS", "5"))   # results per route per date
 CURRENCY    = os.environ.get("CURRENCY", "CAD")
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "8"))   # concurrent SerpApi requests
 
 # Optional time-of-day filter for a specific departure date.
 # Any flight on EARLIEST_DEP_DATE that departs before EARLIEST_DEP_TIME (HH:MM, 24h,
@@ -89,6 +120,7 @@ EARLIEST_DEP_TIME = os.environ.get("EARLIEST_DEP_TIME", "").strip()   # e.g. 19:
 # Google Flights deep-link builder
 # ---------------------------------------------------------------------------
 
+@functools.lru_cache(maxsize=256)
 def google_flights_url(origin: str, destination: str, date: str, adults: int = 1) -> str:
     """
     Build a Google Flights search URL for a one-way trip.
@@ -109,64 +141,206 @@ def google_flights_url(origin: str, destination: str, date: str, adults: int = 1
 # Date helpers
 # ---------------------------------------------------------------------------
 
+_VALID_TRIP_TYPES = frozenset({"outbound", "return", "roundtrip"})
+
+
 def get_departure_dates() -> List[str]:
     """Return the list of outbound departure dates to search."""
     if DEPARTURE_DATES_ENV:
-        return [d.strip() for d in DEPARTURE_DATES_ENV.split(",") if d.strip()]
+        return _split_csv(DEPARTURE_DATES_ENV)
     today = datetime.now()
-    days_list = [int(d.strip()) for d in DAYS_AHEAD_ENV.split(",") if d.strip()]
-    return [(today + timedelta(days=d)).strftime("%Y-%m-%d") for d in days_list]
+    return [(today + timedelta(days=int(d))).strftime("%Y-%m-%d") for d in _split_csv(DAYS_AHEAD_ENV)]
 
 
 def get_return_dates() -> List[str]:
     """Return the list of return dates (for return-leg and round-trip searches)."""
-    return [d.strip() for d in RETURN_DATES_ENV.split(",") if d.strip()]
+    return _split_csv(RETURN_DATES_ENV)
 
 
 def get_active_trip_types() -> List[str]:
-    valid = {"outbound", "return", "roundtrip"}
-    return [t.strip() for t in TRIP_TYPES_ENV.split(",") if t.strip() in valid]
+    return [t for t in _split_csv(TRIP_TYPES_ENV) if t in _VALID_TRIP_TYPES]
 
 
 # ---------------------------------------------------------------------------
 # Duration and layover helpers
 # ---------------------------------------------------------------------------
 
+@functools.lru_cache(maxsize=4096)
 def _format_minutes(mins: int) -> str:
     """Convert integer minutes to '14h 30m'."""
     h, m = divmod(int(mins), 60)
     return f"{h}h {m}m" if m else f"{h}h"
 
 
+# (airport, minutes) -> "ICN (1h 35m)"; the same layovers recur across offers.
+_LAYOVER_LABELS: Dict[Tuple[str, int], str] = {}
+
+
+def _layover_label(airport: str, duration: int) -> str:
+    label = _LAYOVER_LABELS.get((airport, duration))
+    if label is None:
+        label = _LAYOVER_LABELS[(airport, duration)] = f"{escape(airport, quote=False)} ({_format_minutes(duration)})"
+    return label
+
+
 def _format_layovers(layovers: List[Dict[str, Any]]) -> str:
     """Return layover airports with durations, e.g. 'ICN (1h 35m) · PVG (2h 10m)'.
     Returns '—' if direct."""
-    if not layovers:
-        return "—"
-    parts = [
-        f"{l.get('id', '?')} ({_format_minutes(l.get('duration', 0))})"
-        for l in layovers
-    ]
-    return " · ".join(parts)
+    return " · ".join(
+        [_layover_label(l.get("id") or "?", l.get("duration", 0)) for l in layovers]
+    ) or "—"
 
 
 # ---------------------------------------------------------------------------
 # SerpApi client
 # ---------------------------------------------------------------------------
 
+# Every query hits the same host, so share one pooled keep-alive session
+# instead of paying a fresh TCP + TLS handshake per request.  With a single
+# host and pool_maxsize == MAX_WORKERS, each worker thread keeps one reusable
+# connection, so a whole run costs at most MAX_WORKERS handshakes.
+# Transient 429/5xx responses and connection errors are retried with exponential
+# backoff; 400/404 are not retried and are handled in search_flights().
+_RETRY = Retry(
+    total=3,
+    connect=3,
+    read=3,
+    backoff_factor=0.8,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET"]),
+)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=1,   # only serpapi.com is ever contacted
+    pool_maxsize=MAX_WORKERS,
+    max_retries=_RETRY,
+))
+_SESSION.headers.update({
+    "User-Agent":      "flight-finder/1.0",
+    "Accept-Encoding": "gzip, deflate",   # SerpApi JSON compresses well
+})
+
+# Searches run on a thread pool; serialise progress output so lines don't interleave.
+_PRINT_LOCK = threading.Lock()
+
+
+def _log(msg: str) -> None:
+    with _PRINT_LOCK:
+        print(msg, file=sys.stderr)
+
+
+def _json_loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+
+def _json_dumps(data: Any) -> bytes:
+    """Serialise to indented UTF-8 JSON bytes (fixture file format)."""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode("utf-8")
+
+
 def _fixture_path(origin: str, destination: str, dep_date: str, return_date: Optional[str]) -> str:
-    name = f"{origin}_{destination}_{dep_date}"
-    if return_date:
-        name += f"_ret_{return_date}"
-    return os.path.join(FIXTURES_DIR, name + ".json")
+    ret_part = f"_ret_{return_date}" if return_date else ""
+    return os.path.join(FIXTURES_DIR, f"{origin}_{destination}_{dep_date}{ret_part}.json")
 
 
 def _parse_response(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     book_url = data.get("search_metadata", {}).get("google_flights_url", "")
-    results = data.get("best_flights", []) + data.get("other_flights", [])
+    # Groups without flight segments can't be displayed; drop them up front so
+    # they neither reach parse_offer() nor take up one of the MAX_RESULTS slots.
+    results = [
+        fg for fg in data.get("best_flights", []) + data.get("other_flights", [])
+        if fg.get("flights")
+    ][:MAX_RESULTS]
     for fg in results:
         fg["_book_url"] = book_url
-    return results[:MAX_RESULTS]
+    return results
+
+
+# shelve is not safe for concurrent access from the search thread pool.
+_CACHE_LOCK = threading.Lock()
+_cache_dir_ready = False
+
+
+def _ensure_cache_dir() -> None:
+    """Create the cache directory on first use rather than on every lookup."""
+    global _cache_dir_ready
+    if not _cache_dir_ready:
+        # exist_ok makes a race between pool threads here harmless
+        os.makedirs(os.path.dirname(_CACHE_PATH), exist_ok=True)
+        _cache_dir_ready = True
+
+
+def _cache_key(origin: str, destination: str, dep_date: str, return_date: Optional[str]) -> str:
+    raw = f"{origin}|{destination}|{dep_date}|{return_date}|{CURRENCY}|{ADULTS}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _cache_fresh(ts: float, now: float) -> bool:
+    """An entry is usable while younger than CACHE_TTL_SECONDS and from today."""
+    return (
+        now - ts < CACHE_TTL_SECONDS
+        and time.localtime(ts)[:3] == time.localtime(now)[:3]
+    )
+
+
+def _cache_get(key: str) -> Optional[Dict[str, Any]]:
+    """Return the cached raw response for key if it is still fresh.
+
+    Entries also expire at local midnight so a dated report never shows the
+    previous day's prices.  Stale entries are deleted when found.
+    """
+    if CACHE_TTL_SECONDS <= 0:
+        return None
+    try:
+        _ensure_cache_dir()
+        with _CACHE_LOCK:
+            with shelve.open(_CACHE_PATH) as db:
+                entry = db.get(key)
+                if entry and not _cache_fresh(entry["ts"], time.time()):
+                    del db[key]
+                    entry = None
+    except Exception as exc:
+        _log(f"    Cache read failed: {exc}")
+        return None
+    return entry["data"] if entry else None
+
+
+# Previous-day entries are pruned on the first write of each run; everything
+# written after that in the same run is from today.
+_cache_pruned = False
+
+
+def _cache_put(key: str, data: Dict[str, Any]) -> None:
+    global _cache_pruned
+    if CACHE_TTL_SECONDS <= 0:
+        return
+    try:
+        _ensure_cache_dir()
+        with _CACHE_LOCK:
+            with shelve.open(_CACHE_PATH) as db:
+                now = time.time()
+                if not _cache_pruned:
+                    for old_key in [k for k in db.keys() if not _cache_fresh(db[k]["ts"], now)]:
+                        del db[old_key]
+                    _cache_pruned = True
+                db[key] = {"ts": now, "data": data}
+    except Exception as exc:
+        _log(f"    Cache write failed: {exc}")
+
+
+def _save_fixture(fpath: str, data: Dict[str, Any]) -> None:
+    with open(fpath, "wb") as f:
+        f.write(_json_dumps(data))
+    _log(f"    Fixture saved: {os.path.basename(fpath)}")
+
+
+@functools.lru_cache(maxsize=256)
+def _load_fixture(fpath: str) -> Tuple[Dict[str, Any], ...]:
+    """Parse a saved fixture once per process; repeat lookups hit the cache."""
+    with open(fpath, "rb") as f:
+        return tuple(_parse_response(_json_loads(f.read())))
 
 
 def search_flights(
@@ -179,6 +353,8 @@ def search_flights(
 
     With MOCK_MODE=1: reads from a previously saved fixture file (no API call).
     With SAVE_FIXTURES=1: saves the raw API response to fixtures/ after each call.
+    Live responses are served from the on-disk cache while younger than
+    CACHE_TTL_SECONDS.
     """
     fpath = _fixture_path(origin, destination, dep_date, return_date)
 
@@ -189,14 +365,21 @@ def search_flights(
                 f"Mock mode is on but no fixture found: {fpath}\n"
                 f"Run once with SAVE_FIXTURES=1 to capture real responses."
             )
-        with open(fpath) as f:
-            return _parse_response(json.load(f))
+        return list(_load_fixture(fpath))
 
     # ── Live mode: call SerpApi ───────────────────────────────────────────────
     if not SERPAPI_KEY:
         raise RuntimeError(
             "SERPAPI_KEY must be set. Register free at https://serpapi.com"
         )
+    cache_key = _cache_key(origin, destination, dep_date, return_date)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        # A cache hit still has to leave a fixture behind for a later MOCK_MODE replay
+        if SAVE_FIXTURES:
+            _save_fixture(fpath, cached)
+        return _parse_response(cached)
+
     params: Dict[str, Any] = {
         "engine":        "google_flights",
         "api_key":       SERPAPI_KEY,
@@ -210,24 +393,24 @@ def search_flights(
     if return_date:
         params["return_date"] = return_date
 
-    resp = requests.get(SERPAPI_URL, params=params, timeout=30)
+    resp = _SESSION.get(SERPAPI_URL, params=params, timeout=30)
     if resp.status_code == 200:
-        data = resp.json()
+        data = _json_loads(resp.content)
+        _cache_put(cache_key, data)
         if SAVE_FIXTURES:
-            os.makedirs(FIXTURES_DIR, exist_ok=True)
-            with open(fpath, "w") as f:
-                json.dump(data, f, indent=2)
-            print(f"    Fixture saved: {os.path.basename(fpath)}", file=sys.stderr)
+            _save_fixture(fpath, data)
         # Grab the pre-built Google Flights URL from the response metadata –
         # it contains the encoded tfs blob that actually pre-loads the search.
         return _parse_response(data)
     if resp.status_code in (400, 404):
         # Log the API error body so we can diagnose issues (e.g. invalid airport codes)
+        # Truncate the raw bytes before decoding rather than decoding the whole body
+        err_body = resp.content[:300].decode("utf-8", errors="replace")
         try:
-            err_msg = resp.json().get("error", resp.text[:300])
+            err_msg = _json_loads(resp.content).get("error", err_body)
         except Exception:
-            err_msg = resp.text[:300]
-        print(f"    API {resp.status_code} for {origin}->{destination} {dep_date}: {err_msg}", file=sys.stderr)
+            err_msg = err_body
+        _log(f"    API {resp.status_code} for {origin}->{destination} {dep_date}: {err_msg}")
         return []
     resp.raise_for_status()
     return []
@@ -250,6 +433,11 @@ def parse_offer(
     trip_type: 'outbound' | 'return' | 'roundtrip'
     For 'roundtrip', SerpApi type=1 returns the outbound leg + combined price only.
     Return leg details are not included in the initial response.
+
+    Free-text fields taken from the API (airline, via, and dep_time/arr_time
+    when they fall back to the raw time string) are HTML-escaped here, once,
+    so the renderers can emit them as-is.  book_url is left raw and
+    escaped where it is placed in an href.
     """
     flights = flight_group.get("flights", [])
     if not flights:
@@ -262,19 +450,23 @@ def parse_offer(
     dep_at = first_seg.get("departure_airport", {}).get("time", "")
     arr_at = last_seg.get("arrival_airport", {}).get("time", "")
 
-    dep_time = dep_at[11:16] if len(dep_at) >= 16 else dep_at
-    arr_time = arr_at[11:16] if len(arr_at) >= 16 else arr_at
-    arr_date = arr_at[:10]   if len(arr_at) >= 10 else ""
+    _, _, dep_clock = dep_at.partition(" ")
+    arr_day, sep, arr_clock = arr_at.partition(" ")
+    # Malformed times fall back to the raw API string, which must be escaped too
+    dep_time = dep_clock[:5] or escape(dep_at, quote=False)
+    arr_time = arr_clock[:5] or escape(arr_at, quote=False)
+    arr_date = arr_day if sep else ""
 
     # Collect unique airline names across all segments (SerpApi provides full names)
-    seen_airlines: List[str] = []
-    seen_set: set = set()
+    # Plain loop: for the usual 1–3 segments it beats dict.fromkeys over a generator
+    seen: set = set()
+    airlines: List[str] = []
     for seg in flights:
         airline = seg.get("airline", "")
-        if airline and airline not in seen_set:
-            seen_airlines.append(airline)
-            seen_set.add(airline)
-    airline_str = " / ".join(seen_airlines)
+        if airline and airline not in seen:
+            seen.add(airline)
+            airlines.append(airline)
+    airline_str = escape(" / ".join(airlines), quote=False)   # text node, not an attribute
 
     layovers  = flight_group.get("layovers", [])
     stops     = len(layovers)
@@ -291,6 +483,11 @@ def parse_offer(
     origin_code   = first_seg.get("departure_airport", {}).get("id", ORIGIN)
     dest_code_act = last_seg.get("arrival_airport", {}).get("id", dest_code)
 
+    # Prefer SerpApi's pre-built URL; only build our own when it is missing
+    book_url = flight_group.get("_book_url")
+    if not book_url:
+        book_url = google_flights_url(origin_code, dest_code_act, dep_date, ADULTS)
+
     return {
         "trip_type":      trip_type,
         "destination":    dest_name,
@@ -300,6 +497,7 @@ def parse_offer(
         "dep_time":       dep_time,
         "arr_time":       arr_time,
         "arr_date":       arr_date,
+        "arr_cell_html":  _arr_cell(dep_date, arr_time, arr_date),
         "duration":       duration,
         "stops":          stops_str,
         "via":            via_str,
@@ -307,10 +505,7 @@ def parse_offer(
         "price_raw":      price_raw,
         "currency":       CURRENCY,
         "return_date":    return_date or "",
-        "book_url":       (
-                              flight_group.get("_book_url")
-                              or google_flights_url(origin_code, dest_code_act, dep_date, ADULTS)
-                          ),
+        "book_url":       book_url,
     }
 
 
@@ -320,17 +515,29 @@ def parse_offer(
 
 def _too_early(flight: Dict[str, Any]) -> bool:
     """Return True if this flight should be excluded due to the earliest-departure filter."""
-    if not EARLIEST_DEP_DATE or not EARLIEST_DEP_TIME:
-        return False
-    if flight["departure_date"] != EARLIEST_DEP_DATE:
+    if not (EARLIEST_DEP_DATE and EARLIEST_DEP_TIME):
         return False
-    return flight["dep_time"] < EARLIEST_DEP_TIME  # lexicographic HH:MM comparison
+    # lexicographic HH:MM comparison
+    return flight["departure_date"] == EARLIEST_DEP_DATE and flight["dep_time"] < EARLIEST_DEP_TIME
 
 
 # ---------------------------------------------------------------------------
 # Data fetching
 # ---------------------------------------------------------------------------
 
+def _run_search(task: Tuple[str, str, str, str, Optional[str]]) -> List[Dict[str, Any]]:
+    """Pool worker: log the search as it starts, then run it."""
+    trip_type, _, dest_code, dep, ret = task
+    if trip_type == "outbound":
+        _log(f"  [outbound]  {ORIGIN} -> {dest_code}  on  {dep}")
+        return search_flights(ORIGIN, dest_code, dep)
+    if trip_type == "return":
+        _log(f"  [return]    {dest_code} -> {ORIGIN}  on  {dep}")
+        return search_flights(dest_code, ORIGIN, dep)
+    _log(f"  [roundtrip] {ORIGIN} <-> {dest_code}  {dep} / {ret}")
+    return search_flights(ORIGIN, dest_code, dep, ret)
+
+
 def fetch_all_flights(
     dep_dates: List[str],
     ret_dates: List[str],
@@ -338,6 +545,9 @@ def fetch_all_flights(
 ) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
     """Search all destination × date × trip-type combinations.
 
+    Searches are independent, so they are dispatched concurrently on a pool of
+    MAX_WORKERS threads and parsed as they complete.
+
     Returns a nested dict:  results[trip_type][dest_name] = [flight, ...]
     """
     results: Dict[str, Dict[str, List[Dict[str, Any]]]] = {
@@ -345,48 +555,42 @@ def fetch_all_flights(
         for tt in trip_types
     }
 
-    for dest_name, dest_code in DESTINATIONS.items():
+    wanted = frozenset(trip_types)
+    # Evaluated once per fetch so _too_early() is skipped entirely when unset
+    filter_enabled = bool(EARLIEST_DEP_DATE and EARLIEST_DEP_TIME)
+
+    # Valid round-trip (departure, return) pairs are the same for every destination;
+    # ISO dates compare correctly as strings and the return must be after departure.
+    rt_pairs = [(dep, ret) for dep in dep_dates for ret in ret_dates if ret > dep]
 
-        if "outbound" in trip_types:
+    # (trip_type, dest_name, dest_code, dep_date, return_date)
+    tasks: List[Tuple[str, str, str, str, Optional[str]]] = []
+    for dest_name, dest_code in DESTINATIONS.items():
+        if "outbound" in wanted:
             for date in dep_dates:
-                print(f"  [outbound]  {ORIGIN} -> {dest_code}  on  {date}", file=sys.stderr)
-                try:
-                    for fg in search_flights(ORIGIN, dest_code, date):
-                        parsed = parse_offer(fg, dest_name, dest_code, date, "outbound")
-                        if parsed and not _too_early(parsed):
-                            results["outbound"][dest_name].append(parsed)
-                except Exception as exc:
-                    print(f"    Warning: {exc}", file=sys.stderr)
-
-        if "return" in trip_types:
+                tasks.append(("outbound", dest_name, dest_code, date, None))
+        if "return" in wanted:
             for date in ret_dates:
-                print(f"  [return]    {dest_code} -> {ORIGIN}  on  {date}", file=sys.stderr)
-                try:
-                    for fg in search_flights(dest_code, ORIGIN, date):
-                        parsed = parse_offer(fg, dest_name, dest_code, date, "return")
-                        if parsed:
-                            results["return"][dest_name].append(parsed)
-                except Exception as exc:
-                    print(f"    Warning: {exc}", file=sys.stderr)
-
-        if "roundtrip" in trip_types:
-            for dep in dep_dates:
-                for ret in ret_dates:
-                    if ret <= dep:
-                        continue   # return must be after departure
-                    print(
-                        f"  [roundtrip] {ORIGIN} <-> {dest_code}  {dep} / {ret}",
-                        file=sys.stderr,
-                    )
-                    try:
-                        for fg in search_flights(ORIGIN, dest_code, dep, ret):
-                            parsed = parse_offer(
-                                fg, dest_name, dest_code, dep, "roundtrip", ret
-                            )
-                            if parsed and not _too_early(parsed):
-                                results["roundtrip"][dest_name].append(parsed)
-                    except Exception as exc:
-                        print(f"    Warning: {exc}", file=sys.stderr)
+                tasks.append(("return", dest_name, dest_code, date, None))
+        if "roundtrip" in wanted:
+            for dep, ret in rt_pairs:
+                tasks.append(("roundtrip", dest_name, dest_code, dep, ret))
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {ex.submit(_run_search, task): task for task in tasks}
+
+        for fut in as_completed(futures):
+            trip_type, dest_name, dest_code, dep, ret = futures[fut]
+            bucket = results[trip_type][dest_name]
+            # The departure-time filter only applies to legs leaving ORIGIN
+            check_early = filter_enabled and trip_type != "return"
+            try:
+                for fg in fut.result():
+                    parsed = parse_offer(fg, dest_name, dest_code, dep, trip_type, ret)
+                    if parsed and not (check_early and _too_early(parsed)):
+                        bucket.append(parsed)
+            except Exception as exc:
+                _log(f"    Warning: [{trip_type}] {dest_code} {dep}{'/' + ret if ret else ''}: {exc}")
 
     return results
 
@@ -401,37 +605,173 @@ _FLAG: Dict[str, str] = {
     "Taiwan":        "TW",
 }
 
+# (dest_name, dest_code, flag) in DESTINATIONS order, resolved once for the renderers
+_DESTS: Tuple[Tuple[str, str, str], ...] = tuple(
+    (name, code, _FLAG.get(name, "")) for name, code in DESTINATIONS.items()
+)
+
 _HEADER_COLOR = "#1a4f7a"
 _ALT_ROW      = "#f2f7fc"
 
 
+# Table cells use these classes instead of repeating the same inline style on
+# every <td>, which keeps large reports (and the email) much smaller.
+_CSS = (
+    "<style>"
+    f".th{{padding:8px 10px;background:{_HEADER_COLOR};color:#fff;text-align:left;white-space:nowrap}}"
+    ".c{padding:7px 10px;white-space:nowrap}"
+    ".b{font-weight:bold}"
+    f".lk{{color:{_HEADER_COLOR};font-weight:bold}}"
+    "</style>"
+)
+
+
 def _th(text: str) -> str:
-    return (
-        f'<th style="padding:8px 10px; background:{_HEADER_COLOR}; '
-        f'color:#fff; text-align:left; white-space:nowrap;">{text}</th>'
-    )
+    # Header colours are also inlined so headers stay readable if <style> is stripped
+    return f'<th class="th" style="background:{_HEADER_COLOR};color:#fff;">{text}</th>'
 
 
 def _td(text: str, bold: bool = False) -> str:
-    weight = "font-weight:bold;" if bold else ""
-    return f'<td style="padding:7px 10px; {weight} white-space:nowrap;">{text}</td>'
+    return f'<td class="c{" b" if bold else ""}">{text}</td>'
 
 
 def _td_link(url: str, label: str = "Search") -> str:
-    return (
-        f'<td style="padding:7px 10px; white-space:nowrap;">'
-        f'<a href="{url}" target="_blank" '
-        f'style="color:{_HEADER_COLOR}; font-weight:bold;">{label}</a></td>'
-    )
+    return f'<td class="c"><a href="{url}" target="_blank" class="lk">{label}</a></td>'
 
 
-def _next_day(dep_date: str, arr_date: str) -> str:
-    """Return arrival time string, appending +1 badge when it lands the next day."""
-    return '<sup style="color:#c0392b; font-size:9px; margin-left:2px;">+1</sup>' if arr_date and arr_date != dep_date else ""
+def _day_offset(dep_date: str, arr_date: str) -> int:
+    """Days between departure and arrival dates (0 if either is missing or malformed)."""
+    if not arr_date or arr_date == dep_date:
+        return 0
+    try:
+        return datetime.fromisoformat(arr_date).toordinal() - datetime.fromisoformat(dep_date).toordinal()
+    except ValueError:
+        return 0
 
 
+@functools.lru_cache(maxsize=2048)
 def _arr_cell(dep_date: str, arr_time: str, arr_date: str) -> str:
-    return arr_time + _next_day(dep_date, arr_date)
+    """Return arrival time, with a +N / -N badge when it lands on another day."""
+    offset = _day_offset(dep_date, arr_date)
+    if not offset:
+        return arr_time
+    return (
+        f'{arr_time}<sup style="color:#c0392b; font-size:9px; margin-left:2px;">'
+        f'{offset:+d}</sup>'
+    )
+
+
+def _offer_arr_cell(f: Dict[str, Any]) -> str:
+    """Arrival cell for an offer; parse_offer pre-renders it as arr_cell_html."""
+    cell = f.get("arr_cell_html")
+    if cell is None:
+        cell = _arr_cell(f["departure_date"], f["arr_time"], f["arr_date"])
+    return cell
+
+
+# Row templates are assembled once from the cell helpers above and filled per
+# row with str.format_map, instead of nine helper calls + concatenations per row.
+_ROW_TMPL_ONEWAY = (
+    '<tr style="background:{bg};">'
+    + _td("{departure_date}")
+    + _td("{airline}")
+    + _td("{dep_time}")
+    + _td("{arr_cell}")
+    + _td("{duration}")
+    + _td("{stops}")
+    + _td("{via}")
+    + _td("{currency} {price_str}", bold=True)
+    + _td_link("{href}", "Search")
+    + "</tr>"
+)
+
+_ROW_TMPL_ROUNDTRIP = (
+    '<tr style="background:{bg};">'
+    + _td("{departure_date}")
+    + _td("{return_date}")
+    + _td("{airline}")
+    + _td("{dep_time}")
+    + _td("{arr_cell}")
+    + _td("{duration}")
+    + _td("{stops}")
+    + _td("{via}")
+    + _td("{currency} {price_str}", bold=True)
+    + _td_link("{href}", "Search")
+    + "</tr>"
+)
+
+_ROW_TMPL_SUMMARY = (
+    '<tr style="background:{bg};">'
+    + _td("{date}")
+    + _td("{dest_label}")
+    + _td("{airline}")
+    + _td("{dep_time}")
+    + _td("{arr_cell}")
+    + _td("{duration}")
+    + _td("{stops}")
+    + _td("{via}")
+    + _td("{currency} {price_str}", bold=True)
+    + _td_link("{href}", "Search")
+    + "</tr>"
+)
+
+# Complete <thead> blocks only depend on module configuration, so they are
+# built once.  The one-way header still takes the route's airport codes per table.
+_ONEWAY_THEAD_TMPL = (
+    "<thead><tr>"
+    + _th("Dep. Date")
+    + _th("Airline(s)")
+    + _th("Departs ({dep_label})")
+    + _th("Arrives ({arr_label})")
+    + _th("Duration")
+    + _th("Stops")
+    + _th("Via")
+    + _th(f"Price ({CURRENCY})")
+    + _th("Book")
+    + "</tr></thead>"
+)
+
+_ROUNDTRIP_THEAD = (
+    "<thead><tr>"
+    + _th("Departs")
+    + _th("Returns")
+    + _th("Airline(s)")
+    + _th("Dep. Time")
+    + _th("Arr. Time")
+    + _th("Outbound Duration")
+    + _th("Stops")
+    + _th("Via")
+    + _th(f"Total Price ({CURRENCY})")
+    + _th("Book")
+    + "</tr></thead>"
+)
+
+_SUMMARY_THEAD = (
+    "<thead><tr>"
+    + _th("Departure Date")
+    + _th("Destination")
+    + _th("Airline(s)")
+    + _th(f"Departs ({ORIGIN})")
+    + _th("Arrives")
+    + _th("Duration")
+    + _th("Stops")
+    + _th("Via")
+    + _th(f"Best Price ({CURRENCY})")
+    + _th("Book")
+    + "</tr></thead>"
+)
+
+
+_TABLE_OPEN = (
+    '<table cellpadding="0" cellspacing="0" border="0" '
+    'style="border-collapse:collapse; font-family:Arial,sans-serif; font-size:13px; '
+    'width:100%; max-width:1100px; border:1px solid #ccc;">'
+)
+
+# Row ordering: oldest date first, then cheapest.  parse_offer always sets
+# return_date, so the round-trip key can use a plain itemgetter too.
+_ROW_SORT_KEY    = itemgetter("departure_date", "price_raw")
+_RT_ROW_SORT_KEY = itemgetter("departure_date", "return_date", "price_raw")
 
 
 # ── Section renderers ────────────────────────────────────────────────────────
@@ -442,41 +782,21 @@ def _render_oneway_table(
     arr_label: str,
 ) -> str:
     """Render a table of one-way flights (outbound or return leg)."""
-    sorted_f = sorted(flights, key=lambda f: (f["departure_date"], f["price_raw"]))
+    sorted_f = sorted(flights, key=_ROW_SORT_KEY)
     rows: List[str] = []
+    append = rows.append
     for i, f in enumerate(sorted_f):
-        bg = _ALT_ROW if i % 2 == 0 else "#ffffff"
-        rows.append(
-            f'<tr style="background:{bg};">'
-            + _td(f["departure_date"])
-            + _td(f["airline"])
-            + _td(f["dep_time"])
-            + _td(_arr_cell(f["departure_date"], f["arr_time"], f["arr_date"]))
-            + _td(f["duration"])
-            + _td(f["stops"])
-            + _td(f.get("via", "—"))
-            + _td(f'{f["currency"]} {f["price_str"]}', bold=True)
-            + _td_link(f["book_url"], "Search")
-            + "</tr>"
-        )
-    header = (
-        "<tr>"
-        + _th("Dep. Date")
-        + _th("Airline(s)")
-        + _th(f"Departs ({dep_label})")
-        + _th(f"Arrives ({arr_label})")
-        + _th("Duration")
-        + _th("Stops")
-        + _th("Via")
-        + _th(f"Price ({CURRENCY})")
-        + _th("Book")
-        + "</tr>"
-    )
+        append(_ROW_TMPL_ONEWAY.format_map({
+            **f,
+            "bg":       _ALT_ROW if i % 2 == 0 else "#ffffff",
+            "arr_cell": _offer_arr_cell(f),
+            "via":      f.get("via", "—"),
+            "href":     escape(f["book_url"]),
+        }))
+    thead = _ONEWAY_THEAD_TMPL.format(dep_label=dep_label, arr_label=arr_label)
     return (
-        f'<table cellpadding="0" cellspacing="0" border="0" '
-        f'style="border-collapse:collapse; font-family:Arial,sans-serif; font-size:13px; '
-        f'width:100%; max-width:1100px; border:1px solid #ccc;">'
-        f"<thead>{header}</thead>"
+        f"{_TABLE_OPEN}"
+        f"{thead}"
         f"<tbody>{''.join(rows)}</tbody>"
         f"</table>"
     )
@@ -488,46 +808,21 @@ def _render_roundtrip_table(flights: List[Dict[str, Any]]) -> str:
     SerpApi type=1 returns the outbound leg details + combined total price.
     Return leg details are not included (use the Search link to see them).
     """
-    sorted_f = sorted(
-        flights, key=lambda f: (f["departure_date"], f.get("return_date", ""), f["price_raw"])
-    )
+    sorted_f = sorted(flights, key=_RT_ROW_SORT_KEY)
     rows: List[str] = []
+    append = rows.append
     for i, f in enumerate(sorted_f):
-        bg = _ALT_ROW if i % 2 == 0 else "#ffffff"
-        out_arr = _arr_cell(f["departure_date"], f["arr_time"], f["arr_date"])
-        rows.append(
-            f'<tr style="background:{bg};">'
-            + _td(f["departure_date"])
-            + _td(f.get("return_date", ""))
-            + _td(f["airline"])
-            + _td(f["dep_time"])
-            + _td(out_arr)
-            + _td(f["duration"])
-            + _td(f["stops"])
-            + _td(f.get("via", "—"))
-            + _td(f'{f["currency"]} {f["price_str"]}', bold=True)
-            + _td_link(f["book_url"], "Search")
-            + "</tr>"
-        )
-    header = (
-        "<tr>"
-        + _th("Departs")
-        + _th("Returns")
-        + _th("Airline(s)")
-        + _th("Dep. Time")
-        + _th("Arr. Time")
-        + _th("Outbound Duration")
-        + _th("Stops")
-        + _th("Via")
-        + _th(f"Total Price ({CURRENCY})")
-        + _th("Book")
-        + "</tr>"
-    )
+        append(_ROW_TMPL_ROUNDTRIP.format_map({
+            **f,
+            "bg":          _ALT_ROW if i % 2 == 0 else "#ffffff",
+            "arr_cell":    _offer_arr_cell(f),
+            "return_date": f.get("return_date", ""),
+            "via":         f.get("via", "—"),
+            "href":        escape(f["book_url"]),
+        }))
     return (
-        f'<table cellpadding="0" cellspacing="0" border="0" '
-        f'style="border-collapse:collapse; font-family:Arial,sans-serif; font-size:13px; '
-        f'width:100%; max-width:1100px; border:1px solid #ccc;">'
-        f"<thead>{header}</thead>"
+        f"{_TABLE_OPEN}"
+        f"{_ROUNDTRIP_THEAD}"
         f"<tbody>{''.join(rows)}</tbody>"
         f"</table>"
     )
@@ -556,9 +851,8 @@ def render_trip_type_block(
     title, subtitle = labels.get(trip_type, (trip_type.title(), ""))
 
     sections: List[str] = []
-    for dest_name, dest_code in DESTINATIONS.items():
+    for dest_name, dest_code, flag in _DESTS:
         flights = dest_flights.get(dest_name, [])
-        flag = _FLAG.get(dest_name, "")
 
         if trip_type in ("outbound", "return"):
             dep_label = ORIGIN if trip_type == "outbound" else dest_code
@@ -594,6 +888,9 @@ def render_trip_type_block(
     )
 
 
+_NO_SUMMARY_DATA = "<p style='color:#888;'>No outbound flight data found.</p>"
+
+
 def render_summary_table(
     results: Dict[str, Dict[str, List[Dict[str, Any]]]],
     dep_dates: List[str],
@@ -601,49 +898,41 @@ def render_summary_table(
 ) -> str:
     """Cheapest outbound flight per destination per departure date."""
     outbound = results.get("outbound", {})
+    if not any(outbound.values()):
+        return _NO_SUMMARY_DATA
     rows: List[str] = []
+    append = rows.append
+
+    # One pass over all flights: (departure_date, dest_name) -> cheapest flight
+    cheapest_by_cell: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for dest_name, _, _ in _DESTS:
+        for f in outbound.get(dest_name, ()):
+            key = (f["departure_date"], dest_name)
+            cur = cheapest_by_cell.get(key)
+            if cur is None or f["price_raw"] < cur["price_raw"]:
+                cheapest_by_cell[key] = f
 
     for date in dep_dates:
         first = True
-        for dest_name, dest_code in DESTINATIONS.items():
-            dest_flights = [f for f in outbound.get(dest_name, []) if f["departure_date"] == date]
-            if not dest_flights:
+        for dest_name, _, flag in _DESTS:
+            cheapest = cheapest_by_cell.get((date, dest_name))
+            if cheapest is None:
                 continue
-            cheapest = min(dest_flights, key=lambda f: f["price_raw"])
             bg = _ALT_ROW if first else "#ffffff"
             first = False
-            rows.append(
-                f'<tr style="background:{bg};">'
-                + _td(date)
-                + _td(f'{_FLAG.get(dest_name, "")} {dest_name}')
-                + _td(cheapest["airline"])
-                + _td(cheapest["dep_time"])
-                + _td(_arr_cell(cheapest["departure_date"], cheapest["arr_time"], cheapest["arr_date"]))
-                + _td(cheapest["duration"])
-                + _td(cheapest["stops"])
-                + _td(cheapest.get("via", "—"))
-                + _td(f'{cheapest["currency"]} {cheapest["price_str"]}', bold=True)
-                + _td_link(cheapest["book_url"], "Search")
-                + "</tr>"
-            )
+            append(_ROW_TMPL_SUMMARY.format_map({
+                **cheapest,
+                "bg":         bg,
+                "date":       date,
+                "dest_label": f"{flag} {dest_name}",
+                "arr_cell":   _offer_arr_cell(cheapest),
+                "via":        cheapest.get("via", "—"),
+                "href":       escape(cheapest["book_url"]),
+            }))
 
     if not rows:
-        return "<p style='color:#888;'>No outbound flight data found.</p>"
-
-    header = (
-        "<tr>"
-        + _th("Departure Date")
-        + _th("Destination")
-        + _th("Airline(s)")
-        + _th(f"Departs ({ORIGIN})")
-        + _th("Arrives")
-        + _th("Duration")
-        + _th("Stops")
-        + _th("Via")
-        + _th(f"Best Price ({CURRENCY})")
-        + _th("Book")
-        + "</tr>"
-    )
+        return _NO_SUMMARY_DATA
+
     return f"""
 <h3 style="color:{_HEADER_COLOR}; margin-top:0;">
   Cheapest Outbound Flight Per Destination
@@ -651,7 +940,7 @@ def render_summary_table(
 <table cellpadding="0" cellspacing="0" border="0"
        style="border-collapse:collapse; font-family:Arial,sans-serif; font-size:13px;
               width:100%; max-width:1100px; border:1px solid #ccc;">
-  <thead>{header}</thead>
+  {_SUMMARY_THEAD}
   <tbody>{''.join(rows)}</tbody>
 </table>
 """
@@ -673,15 +962,11 @@ def render_html_body(
     dep_str = ", ".join(dep_dates)
     ret_str = ", ".join(ret_dates) if ret_dates else "N/A"
 
-    summary_html = render_summary_table(results, dep_dates, trip_types)
-
-    trip_blocks = "\n<hr style='border:none; border-top:1px solid #ddd; margin:32px 0;'>\n".join(
-        render_trip_type_block(tt, results.get(tt, {}))
-        for tt in trip_types
-    )
-
-    return f"""<!DOCTYPE html>
+    # Collect fragments and join once rather than interpolating the (large)
+    # summary and trip-type sections into one outer f-string.
+    parts: List[str] = [f"""<!DOCTYPE html>
 <html>
+<head>{_CSS}</head>
 <body style="font-family:Arial,sans-serif; color:#222; max-width:1100px;
              margin:auto; padding:20px; font-size:14px;">
 
@@ -701,11 +986,18 @@ def render_html_body(
 
   <hr style="border:none; border-top:1px solid #ddd; margin:20px 0;">
 
-  {summary_html}
+  """]
+    parts.append(render_summary_table(results, dep_dates, trip_types))
+    parts.append("""
 
   <hr style="border:none; border-top:1px solid #ddd; margin:32px 0;">
 
-  {trip_blocks}
+  """)
+    for i, tt in enumerate(trip_types):
+        if i:
+            parts.append("\n<hr style='border:none; border-top:1px solid #ddd; margin:32px 0;'>\n")
+        parts.append(render_trip_type_block(tt, results.get(tt, {})))
+    parts.append(f"""
 
   <p style="font-size:11px; color:#aaa; margin-top:32px;">
     Data source: SerpApi Google Flights.
@@ -716,7 +1008,8 @@ def render_html_body(
   </p>
 </body>
 </html>
-"""
+""")
+    return "".join(parts)
 
 
 # ---------------------------------------------------------------------------
@@ -61,6 +61,9 @@ def test_format_layovers_missing_id():
     result = _format_layovers([{"duration": 60}])
     assert "?" in result
 
+def test_format_layovers_blank_id():
+    assert _format_layovers([{"id": "", "duration": 60}]) == "? (1h)"
+
 def test_format_layovers_missing_duration():
     result = _format_layovers([{"id": "NRT"}])
     assert "NRT" in result
@@ -77,6 +80,12 @@ def test_arr_cell_next_day_has_plus_one():
     assert "06:45" in result
     assert "+1" in result
 
+def test_arr_cell_two_days_later_has_plus_two():
+    assert "+2" in _arr_cell("2026-10-23", "02:10", "2026-10-25")
+
+def test_arr_cell_previous_day_has_minus_one():
+    assert "-1" in _arr_cell("2026-11-05", "21:00", "2026-11-04")
+
 def test_arr_cell_empty_arr_date_no_badge():
     result = _arr_cell("2026-10-23", "10:00", "")
     assert result == "10:00"
@@ -209,6 +218,37 @@ def test_parse_offer_arrival_time_and_date():
     assert r["arr_time"] == "02:10"
     assert r["arr_date"] == "2026-10-25"
 
+def test_parse_offer_malformed_times_passed_through():
+    group = {
+        "flights": [{
+            "departure_airport": {"id": "YYZ", "time": "20:15"},
+            "arrival_airport":   {"id": "NRT"},
+            "airline": "Air Canada",
+        }],
+        "price": 900,
+    }
+    r = parse_offer(group, "Japan", "TYO", "2026-10-23")
+    assert r["dep_time"] == "20:15"
+    assert r["arr_time"] == ""
+    assert r["arr_date"] == ""
+
+def test_parse_offer_malformed_time_fallback_is_escaped():
+    group = {
+        "flights": [{
+            "departure_airport": {"id": "YYZ", "time": "<b>20:15</b>"},
+            "arrival_airport":   {"id": "NRT", "time": "a&b"},
+            "airline": "Air Canada",
+        }],
+        "price": 900,
+    }
+    r = parse_offer(group, "Japan", "TYO", "2026-10-23")
+    assert r["dep_time"] == "&lt;b&gt;20:15&lt;/b&gt;"
+    assert r["arr_time"] == "a&amp;b"
+
+def test_parse_offer_prerenders_arrival_cell():
+    r = parse_offer(_MULTI_STOP_GROUP, "Japan", "TYO", "2026-10-23")
+    assert r["arr_cell_html"] == _arr_cell("2026-10-23", "02:10", "2026-10-25")
+
 def test_parse_offer_duration():
     r = parse_offer(_MULTI_STOP_GROUP, "Japan", "TYO", "2026-10-23")
     assert r["duration"] == "17h 5m"
@@ -230,6 +270,11 @@ def test_parse_offer_same_airline_not_duplicated():
     r = parse_offer(_SAME_AIRLINE_TWO_SEGMENTS, "Japan", "TYO", "2026-10-23")
     assert r["airline"] == "Air Canada"
 
+def test_parse_offer_escapes_airline_html():
+    group = {**_DIRECT_GROUP, "flights": [{**_DIRECT_GROUP["flights"][0], "airline": "A&B <Air> 'X'"}]}
+    r = parse_offer(group, "Japan", "TYO", "2026-10-23")
+    assert r["airline"] == "A&amp;B &lt;Air&gt; 'X'"   # quotes only matter in attributes
+
 def test_parse_offer_price_raw():
     r = parse_offer(_MULTI_STOP_GROUP, "Japan", "TYO", "2026-10-23")
     assert r["price_raw"] == 1450.0
@@ -278,6 +323,180 @@ def test_parse_offer_destination_stored():
     assert r["dest_code"] == "TYO"
 
 
+# ── _parse_response ──────────────────────────────────────────────────────────
+
+def test_parse_response_skips_groups_without_flights():
+    data = {
+        "search_metadata": {"google_flights_url": "https://example.test/gf"},
+        "best_flights": [{"flights": []}, dict(_DIRECT_GROUP)],
+        "other_flights": [{"price": 100}],
+    }
+    groups = drf._parse_response(data)
+    assert len(groups) == 1
+    assert groups[0]["_book_url"] == "https://example.test/gf"
+
+
+# ── search_flights (mock mode) ───────────────────────────────────────────────
+
+def test_search_flights_mock_mode_reads_fixture_once(monkeypatch, tmp_path):
+    import json
+    fixture = tmp_path / "YYZ_NRT_2026-10-23.json"
+    fixture.write_text(json.dumps({
+        "search_metadata": {"google_flights_url": "https://example.test/gf"},
+        "best_flights": [_DIRECT_GROUP],
+    }))
+    monkeypatch.setattr(drf, "MOCK_MODE", True)
+    monkeypatch.setattr(drf, "FIXTURES_DIR", str(tmp_path))
+    drf._load_fixture.cache_clear()
+
+    first = drf.search_flights("YYZ", "NRT", "2026-10-23")
+    second = drf.search_flights("YYZ", "NRT", "2026-10-23")
+    assert first[0]["_book_url"] == "https://example.test/gf"
+    assert second == first
+    assert drf._load_fixture.cache_info().hits == 1
+    drf._load_fixture.cache_clear()
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_helpers_round_trip(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(drf, "orjson", None)
+    elif drf.orjson is None:
+        pytest.skip("orjson not installed")
+    data = {"best_flights": [_DIRECT_GROUP], "note": "Tōkyō"}
+    assert drf._json_loads(drf._json_dumps(data)) == data
+
+
+# ── search_flights (live-response cache) ─────────────────────────────────────
+
+class _FakeResponse:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.content = drf._json_dumps(payload)
+
+
+class _FakeSession:
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        return _FakeResponse(self.payload)
+
+
+def _live_mode(monkeypatch, tmp_path, ttl):
+    session = _FakeSession({"best_flights": [_DIRECT_GROUP]})
+    monkeypatch.setattr(drf, "MOCK_MODE", False)
+    monkeypatch.setattr(drf, "SAVE_FIXTURES", False)
+    monkeypatch.setattr(drf, "SERPAPI_KEY", "test-key")
+    monkeypatch.setattr(drf, "CACHE_TTL_SECONDS", ttl)
+    monkeypatch.setattr(drf, "_CACHE_PATH", str(tmp_path / "_cache.db"))
+    monkeypatch.setattr(drf, "_SESSION", session)
+    return session
+
+def test_search_flights_second_call_served_from_cache(monkeypatch, tmp_path):
+    session = _live_mode(monkeypatch, tmp_path, ttl=3600)
+    first = drf.search_flights("YYZ", "NRT", "2026-10-23")
+    second = drf.search_flights("YYZ", "NRT", "2026-10-23")
+    assert session.calls == 1
+    assert second == first
+
+def test_search_flights_cache_hit_still_saves_fixture(monkeypatch, tmp_path):
+    session = _live_mode(monkeypatch, tmp_path, ttl=3600)
+    monkeypatch.setattr(drf, "FIXTURES_DIR", str(tmp_path))
+    drf.search_flights("YYZ", "NRT", "2026-10-23")   # warms the cache
+    monkeypatch.setattr(drf, "SAVE_FIXTURES", True)
+    drf.search_flights("YYZ", "NRT", "2026-10-23")
+    assert session.calls == 1
+    assert (tmp_path / "YYZ_NRT_2026-10-23.json").exists()
+
+def test_cache_dir_created_once(monkeypatch, tmp_path):
+    _live_mode(monkeypatch, tmp_path, ttl=3600)
+    monkeypatch.setattr(drf, "_CACHE_PATH", str(tmp_path / "cache" / "_cache.db"))
+    monkeypatch.setattr(drf, "_cache_dir_ready", False)
+    made = []
+    real_makedirs = drf.os.makedirs
+    monkeypatch.setattr(drf.os, "makedirs", lambda *a, **kw: made.append(a) or real_makedirs(*a, **kw))
+    drf.search_flights("YYZ", "NRT", "2026-10-23")
+    drf.search_flights("YYZ", "NRT", "2026-10-23")
+    assert made == [(str(tmp_path / "cache"),)]
+
+def test_search_flights_cache_disabled_with_zero_ttl(monkeypatch, tmp_path):
+    session = _live_mode(monkeypatch, tmp_path, ttl=0)
+    drf.search_flights("YYZ", "NRT", "2026-10-23")
+    drf.search_flights("YYZ", "NRT", "2026-10-23")
+    assert session.calls == 2
+
+def test_cache_entry_from_previous_day_is_stale(monkeypatch, tmp_path):
+    import shelve, time
+    _live_mode(monkeypatch, tmp_path, ttl=48 * 3600)
+    yesterday = time.time() - 24 * 3600
+    with shelve.open(drf._CACHE_PATH) as db:
+        db["k"] = {"ts": yesterday, "data": {"best_flights": []}}
+    assert drf._cache_get("k") is None
+    with shelve.open(drf._CACHE_PATH) as db:
+        assert "k" not in db   # stale entry deleted on lookup
+
+def test_cache_put_prunes_previous_day_entries(monkeypatch, tmp_path):
+    import shelve, time
+    _live_mode(monkeypatch, tmp_path, ttl=48 * 3600)
+    monkeypatch.setattr(drf, "_cache_pruned", False)
+    with shelve.open(drf._CACHE_PATH) as db:
+        db["old"] = {"ts": time.time() - 24 * 3600, "data": {}}
+    drf._cache_put("new", {"best_flights": []})
+    with shelve.open(drf._CACHE_PATH) as db:
+        assert set(db.keys()) == {"new"}
+
+def test_cache_key_varies_with_return_date():
+    assert drf._cache_key("YYZ", "NRT", "2026-10-23", None) != \
+        drf._cache_key("YYZ", "NRT", "2026-10-23", "2026-11-05")
+
+
+# ── fetch_all_flights ────────────────────────────────────────────────────────
+
+def test_fetch_all_flights_collects_every_trip_type(monkeypatch):
+    calls = []
+
+    def fake_search(origin, destination, dep_date, return_date=None):
+        calls.append((origin, destination, dep_date, return_date))
+        return [_DIRECT_GROUP]
+
+    monkeypatch.setattr(drf, "search_flights", fake_search)
+    monkeypatch.setattr(drf, "DESTINATIONS", {"Japan (Tokyo)": "NRT"})
+    monkeypatch.setattr(drf, "EARLIEST_DEP_DATE", "")
+    monkeypatch.setattr(drf, "EARLIEST_DEP_TIME", "")
+    results = drf.fetch_all_flights(
+        ["2026-10-23"], ["2026-10-20", "2026-11-05"], ["outbound", "return", "roundtrip"]
+    )
+    assert len(calls) == 4   # 1 outbound + 2 return + 1 valid roundtrip pair
+    assert ("NRT", "YYZ", "2026-11-05", None) in calls
+    assert len(results["outbound"]["Japan (Tokyo)"]) == 1
+    assert len(results["return"]["Japan (Tokyo)"]) == 2
+    assert results["roundtrip"]["Japan (Tokyo)"][0]["return_date"] == "2026-11-05"
+
+def test_fetch_all_flights_search_error_is_skipped(monkeypatch):
+    def failing_search(origin, destination, dep_date, return_date=None):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(drf, "search_flights", failing_search)
+    results = drf.fetch_all_flights(["2026-10-23"], [], ["outbound"])
+    assert all(flights == [] for flights in results["outbound"].values())
+
+
+def test_fetch_all_flights_warning_names_failed_query(monkeypatch, capsys):
+    def search(origin, destination, dep_date, return_date=None):
+        if return_date == "2026-11-05":
+            raise RuntimeError("boom")
+        return []
+
+    monkeypatch.setattr(drf, "search_flights", search)
+    monkeypatch.setattr(drf, "DESTINATIONS", {"Taiwan": "TPE"})
+    drf.fetch_all_flights(["2026-10-23"], ["2026-11-05"], ["roundtrip"])
+    assert "Warning: [roundtrip] TPE 2026-10-23/2026-11-05: boom" in capsys.readouterr().err
+
+
 # ── HTML rendering regression tests ──────────────────────────────────────────
 # These guard against accidental removal of columns, data, or structural tags.
 
@@ -349,6 +568,10 @@ def test_oneway_table_search_link_present():
     html = _render_oneway_table(_SAMPLE_FLIGHTS, "YYZ", "TYO")
     assert "tfs=abc" in html
 
+def test_oneway_table_escapes_book_url_in_href():
+    flights = [{**_SAMPLE_FLIGHTS[0], "book_url": "https://example.test/?a=1&b=2"}]
+    assert 'href="https://example.test/?a=1&amp;b=2"' in _render_oneway_table(flights, "YYZ", "TYO")
+
 def test_oneway_table_sorted_oldest_date_first():
     html = _render_oneway_table(_SAMPLE_FLIGHTS, "YYZ", "TYO")
     assert html.find("2026-10-23") < html.find("2026-10-24")
@@ -392,6 +615,14 @@ def test_summary_table_shows_cheapest_per_date():
     assert "1,450" in html   # cheapest Oct 23
     assert "1,200" in html   # cheapest Oct 24
 
+def test_summary_table_picks_lowest_price_within_a_date():
+    pricier = {**_SAMPLE_FLIGHTS[1], "departure_date": "2026-10-23",
+               "price_raw": 2000.0, "price_str": "2,000"}
+    results = {"outbound": {"Japan (Tokyo)": [pricier, _SAMPLE_FLIGHTS[0]]}}
+    html = render_summary_table(results, ["2026-10-23"], ["outbound"])
+    assert "1,450" in html
+    assert "2,000" not in html
+
 def test_summary_table_has_via_column_header():
     results = {"outbound": {"Japan (Tokyo)": _SAMPLE_FLIGHTS, "Japan (Osaka)": [], "Taiwan": []}}
     html = render_summary_table(results, ["2026-10-23"], ["outbound"])
@@ -424,6 +655,13 @@ def test_html_body_toronto_in_title():
     html = render_html_body(results, ["2026-10-23"], [], ["outbound"], "2026-02-22")
     assert "Toronto" in html
 
+def test_html_body_defines_cell_classes():
+    results = {"outbound": {"Japan (Tokyo)": _SAMPLE_FLIGHTS, "Japan (Osaka)": [], "Taiwan": []}}
+    html = render_html_body(results, ["2026-10-23"], [], ["outbound"], "2026-02-22")
+    assert "<style>" in html
+    assert '<td class="c">' in html
+    assert '<td style="padding' not in html
+
 
 # ── EMAIL_TO multi-recipient parsing ─────────────────────────────────────────
 
@@ -441,3 +679,6 @@ def test_email_to_single_recipient_still_a_list(monkeypatch):
     monkeypatch.setenv("EMAIL_TO", "only@example.com")
     recipients = [e.strip() for e in os.environ.get("EMAIL_TO", "").split(",") if e.strip()]
     assert recipients == ["only@example.com"]
+
+def test_split_csv_strips_and_drops_empty_items():
+    assert drf._split_csv(" a@example.com,, b@example.com ,") == ["a@example.com", "b@example.com"]